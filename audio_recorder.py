@@ -1,50 +1,143 @@
 import tkinter as tk
 from tkinter import ttk
-import pyperclip
 import sounddevice as sd
 import numpy as np
-from scipy.io.wavfile import write
+from scipy.signal import resample_poly
 import threading
-import queue
+from concurrent.futures import ThreadPoolExecutor
+import struct
 import time
 import os
-from whisper_client import WhisperClient
+from transcriber_process import TranscriberProcess
 import keyboard
+import webrtcvad
 from pystray import Icon, MenuItem, Menu
 from PIL import Image
 import platform
+import ctypes
+import ctypes.util
+
+# The only sample rates webrtcvad accepts
+VAD_SAMPLE_RATES = (8000, 16000, 32000, 48000)
+
+# RIFF/WAVE header for 16-bit mono PCM, compiled once and packed per write
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
+
+def write_wav(filename, samplerate, samples):
+    # Writes int16 mono samples with a single header pack and a zero-copy write of the sample buffer
+    data = memoryview(samples).cast('B')
+    header = WAV_HEADER.pack(b"RIFF", 36 + len(data), b"WAVE", b"fmt ", 16, 1, 1, samplerate, samplerate * 2, 2, 16,
+                             b"data", len(data))
+    with open(filename, 'wb') as wav_file:
+        wav_file.write(header)
+        wav_file.write(data)
+
+
+def create_system_sound(filename):
+    # macOS: register the sound with AudioToolbox once so playing it later is a single non-blocking call
+    core_foundation = ctypes.CDLL(ctypes.util.find_library('CoreFoundation'))
+    audio_toolbox = ctypes.CDLL(ctypes.util.find_library('AudioToolbox'))
+    core_foundation.CFURLCreateFromFileSystemRepresentation.restype = ctypes.c_void_p
+    core_foundation.CFURLCreateFromFileSystemRepresentation.argtypes = [ctypes.c_void_p, ctypes.c_char_p,
+                                                                        ctypes.c_long, ctypes.c_bool]
+    core_foundation.CFRelease.argtypes = [ctypes.c_void_p]
+    audio_toolbox.AudioServicesCreateSystemSoundID.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint32)]
+    audio_toolbox.AudioServicesPlaySystemSound.argtypes = [ctypes.c_uint32]
+
+    path = os.path.abspath(filename).encode()
+    url = core_foundation.CFURLCreateFromFileSystemRepresentation(None, path, len(path), False)
+    sound_id = ctypes.c_uint32()
+    status = audio_toolbox.AudioServicesCreateSystemSoundID(url, ctypes.byref(sound_id))
+    core_foundation.CFRelease(url)
+    if status != 0:
+        raise OSError(f"AudioServicesCreateSystemSoundID failed with status {status}")
+    return lambda: audio_toolbox.AudioServicesPlaySystemSound(sound_id.value)
 
 
 class AudioRecorder:
-    def __init__(self, master, model_name="medium.en", shortcut="alt+shift+r", notify_clipboard_saving=True):
+    def __init__(self, master, model_name="medium.en", shortcut="alt+shift+r", notify_clipboard_saving=True,
+                 model_idle_timeout=None, keep_recordings=False, streaming_mode=False):
         self.system_platform = platform.system()
-        self.output_folder = "output"
+        self.output_folder = os.path.abspath("output")
+        os.makedirs(self.output_folder, exist_ok=True)
         self.master = master
         self.master.title("WhisperClip")
-        self.master.geometry("200x100")
+        self.master.geometry("200x140")
         # self.master.iconbitmap('./assets/whisper_clip-centralized.ico')
 
         self.is_recording = False
-        self.recordings = []
-        self.transcription_queue = queue.Queue()
-        self.transcriber = WhisperClient(model_name=model_name)
-        self.keep_transcribing = True
+        self._start_evt = threading.Event()
+        self._stop_evt = threading.Event()
+        self._capture_sr = 16000
+        # Preallocated raw int16 capture buffer (10 minutes at 16 kHz mono), grown only if a recording outlasts it.
+        # _buf_idx counts bytes.
+        self._buf = bytearray(16000 * 600 * 2)
+        self._buf_idx = 0
+        # Reusable float32 buffer for the 16 kHz audio; only the VAD-selected copy of it leaves transcribe_pcm
+        self._audio_16k = np.empty(16000 * 600, dtype=np.float32)
+        # WebRTC voice activity detector used to drop silence before it reaches Whisper
+        self._vad = webrtcvad.Vad(2)
+        # Streaming mode endpoints live on its own detector, so its state never mixes with the gating above
+        self._stream_vad = webrtcvad.Vad(2)
         self.shortcut = shortcut
         self.notify_clipboard_saving = notify_clipboard_saving
+        self.notification_sound_file = './assets/saved-on-clipboard-sound.wav'
+        self._play_system_sound = None
+        if self.system_platform == 'Darwin' and self.notify_clipboard_saving:
+            try:
+                self._play_system_sound = create_system_sound(self.notification_sound_file)
+            except (OSError, AttributeError) as e:
+                # The sound is only a courtesy, so don't let it stop the app from starting
+                print(f"Could not load the notification sound, disabling it: {e}")
+                self.notify_clipboard_saving = False
         
         # Add thread management
-        self.model_loading_thread = None
-        self.model_ready = threading.Event()
+        # Archive WAVs are written on a background worker, off the stop/transcribe path
+        self._io_pool = ThreadPoolExecutor(max_workers=1)
+        self.wav_write_future = None
+
+        # Whisper runs in its own process so inference never holds this process's GIL. The model is loaded at
+        # startup and kept resident until exit, unless an idle timeout (in seconds) is configured.
+        # Started before any thread so the fork on Linux happens in a single-threaded process.
+        self.transcriber = TranscriberProcess(model_name=model_name, model_idle_timeout=model_idle_timeout)
+        self.transcriber.start()
+
+        # One long-lived recording worker, parked until start_recording wakes it
+        self.record_thread = threading.Thread(target=self.record_audio, daemon=True)
+        self.record_thread.start()
 
         self.record_button = tk.Button(self.master, text="🎙", command=self.toggle_recording, font=("Arial", 24),
                                        bg="white")
         self.record_button.pack(expand=True)
 
         self.save_to_clipboard = tk.BooleanVar(value=True)
+        # Plain mirror of the checkbox so reading it doesn't round-trip through Tcl
+        self._save_to_clipboard = True
+        self.save_to_clipboard.trace_add("write", self.on_save_to_clipboard_changed)
         self.clipboard_checkbox = tk.Checkbutton(self.master, text="Save to Clipboard", variable=self.save_to_clipboard)
         self.clipboard_checkbox.pack()
 
-        self.transcription_thread = threading.Thread(target=self.process_transcriptions)
+        # Recordings are only written to disk when the user opts in to keeping them
+        self.keep_recordings = tk.BooleanVar(value=keep_recordings)
+        self._keep_recordings = keep_recordings
+        self.keep_recordings.trace_add("write", self.on_keep_recordings_changed)
+        self.keep_recordings_checkbox = tk.Checkbutton(self.master, text="Keep Recordings",
+                                                       variable=self.keep_recordings)
+        self.keep_recordings_checkbox.pack()
+
+        # Streaming mode transcribes each utterance as soon as the speaker pauses, without waiting for the stop
+        self.streaming_mode = tk.BooleanVar(value=streaming_mode)
+        self._streaming_mode = streaming_mode
+        self.streaming_mode.trace_add("write", self.on_streaming_mode_changed)
+        self.streaming_mode_checkbox = tk.Checkbutton(self.master, text="Streaming Mode", variable=self.streaming_mode)
+        self.streaming_mode_checkbox.pack()
+
+        # Text transcribed so far for the latest recording (streaming mode delivers it in several parts)
+        self._transcribed_filename = None
+        self._transcribed_text = ""
+
+        self.transcription_thread = threading.Thread(target=self.process_transcriptions, daemon=True)
         self.transcription_thread.start()
 
         # Set up the global shortcut and system tray icon
@@ -54,9 +147,14 @@ class AudioRecorder:
         # Stop all processes when the window is closed
         self.master.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    def load_model_async(self):
-        self.transcriber.load_model()
-        self.model_ready.set()
+    def on_save_to_clipboard_changed(self, *args):
+        self._save_to_clipboard = self.save_to_clipboard.get()
+
+    def on_keep_recordings_changed(self, *args):
+        self._keep_recordings = self.keep_recordings.get()
+
+    def on_streaming_mode_changed(self, *args):
+        self._streaming_mode = self.streaming_mode.get()
 
     def toggle_recording(self):
         if self.is_recording:
@@ -68,83 +166,237 @@ class AudioRecorder:
         self.is_recording = True
         self.record_button.config(bg="red")
         
-        # Start model loading in parallel
-        self.model_ready.clear()
-        self.model_loading_thread = threading.Thread(target=self.load_model_async)
-        self.model_loading_thread.start()
-        
-        # Start recording immediately
-        self.record_thread = threading.Thread(target=self.record_audio)
-        self.record_thread.start()
+        # Reload the model in parallel if it was unloaded while idle
+        self.transcriber.load_model()
+
+        # Wake the recording worker; neither this nor stop_recording blocks the caller. The stop event is cleared
+        # by the worker itself, so a quick stop/start can't erase a stop the current recording hasn't seen yet
+        self._start_evt.set()
 
     def stop_recording(self):
         self.is_recording = False
         self.record_button.config(bg="white")
-        sd.stop()
-        self.record_thread.join()
-        
-        if self.recordings:
-            audio_data = np.concatenate(self.recordings)
-            audio_data = (audio_data * 32767).astype(np.int16)
-            os.makedirs(self.output_folder, exist_ok=True)
-            filename = f"{self.output_folder}/audio_{int(time.time())}.wav"
-            write(filename, 44100, audio_data)
-            self.recordings = []
-            self.transcription_queue.put((filename, self.model_loading_thread))
+        self._stop_evt.set()
+
+    def process_recording(self, transcribed_until=0, streamed=False):
+        # Runs on the recording worker once the input stream is closed
+        if self._buf_idx:
+            audio_data = np.frombuffer(self._buf, dtype=np.int16, count=self._buf_idx // 2)
+            if self._keep_recordings:
+                self.wav_write_future = self._io_pool.submit(write_wav, self._recording_filename, self._capture_sr,
+                                                             audio_data)
+            # In streaming mode only the audio after the last submitted utterance is left
+            if not self.transcribe_pcm(audio_data[transcribed_until:]):
+                if streamed:
+                    # Nothing after the last utterance, but the UI still needs to know the recording is complete
+                    self.transcriber.submit(None, self._recording_filename)
+                else:
+                    print("No speech detected, skipping transcription.")
         else:
             print("No audio data recorded. Please check your audio input device.")
-            # If no audio was recorded, wait for model loading and unload it
-            if self.model_loading_thread and self.model_loading_thread.is_alive():
-                self.model_loading_thread.join()
-                self.transcriber.unload_model()
 
-    def play_notification_sound(self):
-        sound_file = './assets/saved-on-clipboard-sound.wav'
+    def transcribe_pcm(self, audio_data, final=True, gate=True):
+        # Returns whether anything was sent to Whisper. final marks the last part of the recording.
+        if not len(audio_data):
+            return False
 
+        # Hand Whisper 16 kHz float32 straight from memory; the WAV file is only an optional archive
+        pcm = vad_pcm = audio_data
+        if self._capture_sr != 16000:
+            pcm = resample_poly(pcm, 16000, self._capture_sr)
+            # The VAD runs on the resampled signal, since the capture rate may be one webrtcvad rejects
+            vad_pcm = np.clip(pcm, -32768, 32767).astype(np.int16)
+        if len(self._audio_16k) < len(pcm):
+            self._audio_16k = np.empty(max(len(pcm), 2 * len(self._audio_16k)), dtype=np.float32)
+        audio_16k = self._audio_16k[:len(pcm)]
+        # Scale and convert in a single pass, with no float64 temporary
+        np.multiply(pcm, np.float32(1 / 32768), out=audio_16k)
+
+        if not gate:
+            # Already endpointed by stream_utterances, pre-roll included; copied since the buffer is reused
+            self.transcriber.submit(audio_16k.copy(), self._recording_filename, final)
+            return True
+
+        # Keep only the 30 ms frames the VAD flags as speech (plus a short margin before and after each)
+        speech = self.detect_speech_frames(vad_pcm, 16000)
+        if not speech.any():
+            return False
+        frame_len = 16000 * 30 // 1000
+        speech_16k = audio_16k[:len(speech) * frame_len].reshape(-1, frame_len)[speech].ravel()
+        if speech[-1]:
+            speech_16k = np.concatenate((speech_16k, audio_16k[len(speech) * frame_len:]))
+        self.transcriber.submit(speech_16k, self._recording_filename, final)
+        return True
+
+    def stream_utterances(self, frame_ms=30, endpoint_ms=600, preroll_ms=200):
+        # Runs while the input stream is open: each utterance is sent to Whisper as soon as it is followed by
+        # endpoint_ms of silence. Returns the sample offset up to which audio has been submitted, and whether
+        # any utterance was.
+        frame_len = self._capture_sr * frame_ms // 1000
+        preroll = self._capture_sr * preroll_ms // 1000
+        segment_start = checked = 0
+        speaking = streamed = False
+        silent_frames = 0
+        while not self._stop_evt.wait(0.1):
+            available = self._buf_idx // 2
+            # Read after the index: if the callback has grown the buffer, the new one holds everything up to it
+            buf = self._buf
+            while checked + frame_len <= available:
+                frame = bytes(memoryview(buf)[checked * 2:(checked + frame_len) * 2])
+                checked += frame_len
+                vad_sr = self._capture_sr
+                if vad_sr not in VAD_SAMPLE_RATES:
+                    frame = resample_poly(np.frombuffer(frame, dtype=np.int16), 16000, vad_sr)
+                    frame, vad_sr = np.clip(frame, -32768, 32767).astype(np.int16).tobytes(), 16000
+                if self._stream_vad.is_speech(frame, vad_sr):
+                    speaking = True
+                    silent_frames = 0
+                elif speaking:
+                    silent_frames += 1
+                    if silent_frames * frame_ms >= endpoint_ms:
+                        utterance = np.frombuffer(buf, dtype=np.int16, count=checked)[segment_start:]
+                        streamed |= self.transcribe_pcm(utterance, final=False, gate=False)
+                        segment_start = checked
+                        speaking = False
+                else:
+                    # Drop leading silence, keeping a short pre-roll before the next utterance
+                    segment_start = max(segment_start, checked - preroll)
+        return segment_start, streamed
+
+    def detect_speech_frames(self, pcm, samplerate, frame_ms=30, hangover_ms=200, lookback_ms=90):
+        frame_len = samplerate * frame_ms // 1000
+        # The VAD fires a little after a word starts, so the frames just before it are kept too
+        lookback = lookback_ms // frame_ms
+        # webrtcvad only accepts immutable bytes
+        pcm_bytes = pcm.tobytes()
+        speech = np.zeros(len(pcm) // frame_len, dtype=bool)
+        hangover = 0
+        for i in range(len(speech)):
+            frame = pcm_bytes[i * frame_len * 2:(i + 1) * frame_len * 2]
+            if self._vad.is_speech(frame, samplerate):
+                speech[max(0, i - lookback):i + 1] = True
+                hangover = hangover_ms // frame_ms
+            elif hangover:
+                speech[i] = True
+                hangover -= 1
+        return speech
+
+    def play_notification_sound(self):
+        # Both platforms return immediately and play the sound in the background
         if self.system_platform == 'Windows':
             import winsound
-            winsound.PlaySound(sound_file, winsound.SND_FILENAME)
+            winsound.PlaySound(self.notification_sound_file,
+                               winsound.SND_FILENAME | winsound.SND_ASYNC | winsound.SND_NOWAIT)
         elif self.system_platform == 'Darwin':  # MacOS
-            os.system(f'afplay {sound_file}')
+            self._play_system_sound()
         else:
             print(f'Unsupported platform. Please open an issue to request support for your operating system. System: '
                   f'{self.system_platform}')
 
     def process_transcriptions(self):
-        while self.keep_transcribing:
-            try:
-                filename, loading_thread = self.transcription_queue.get(timeout=1)
-                
-                # Wait for model to be ready if it's still loading
-                if loading_thread and loading_thread.is_alive():
-                    self.model_ready.wait()  # Wait for model loading to complete
-                
-                transcription = self.transcriber.transcribe(filename)
-                print(f"Transcription for {filename}:", transcription)
-                self.transcription_queue.task_done()
-                
-                if self.save_to_clipboard.get():
-                    pyperclip.copy(transcription)
-                    if self.notify_clipboard_saving:
-                        self.play_notification_sound()
-                
-                # Unload model after transcription is complete
-                self.transcriber.unload_model()
-                self.model_ready.clear()
-                
-            except queue.Empty:
-                continue
+        while True:
+            # Block until the transcriber process sends a result; None is the shutdown sentinel
+            result = self.transcriber.get_result()
+            if result is None:
+                break
+            self.master.after(0, self.handle_transcription, *result)
+
+    def handle_transcription(self, filename, transcription, final, error=None):
+        # Runs on the Tk thread, once per decoded segment and once more with final set when the recording is done
+        if error is not None:
+            print(f"Transcription failed for {filename}: {error}")
+            return
+
+        if filename == self._transcribed_filename:
+            if transcription:
+                self._transcribed_text = " ".join((self._transcribed_text, transcription)).lstrip()
+        else:
+            self._transcribed_filename = filename
+            self._transcribed_text = transcription
+
+        if self._save_to_clipboard:
+            if transcription:
+                self.copy_to_clipboard(self._transcribed_text)
+            if final and self.notify_clipboard_saving:
+                self.play_notification_sound()
+
+        if final:
+            print(f"Transcription for {filename}:", self._transcribed_text)
+
+    def copy_to_clipboard(self, text):
+        # Tk's own clipboard instead of pyperclip, which spawns xclip/xsel or pbcopy for every copy
+        self.master.clipboard_clear()
+        self.master.clipboard_append(text)
+        self.master.update_idletasks()
 
     def on_close(self):
         self.master.withdraw()  # Hide the window
 
+    def select_capture_rate(self):
+        # Capture at Whisper's native 16 kHz when the input device allows it, otherwise at 48 kHz (a clean 3:1),
+        # and failing both at the device's own default rate (e.g. 44.1 kHz in WASAPI shared mode)
+        for samplerate in (16000, 48000):
+            try:
+                sd.check_input_settings(samplerate=samplerate, channels=1, dtype='int16')
+                return samplerate
+            except (sd.PortAudioError, ValueError):
+                pass
+        return int(sd.query_devices(kind='input')['default_samplerate'])
+
     def record_audio(self):
-        with sd.InputStream(callback=self.audio_callback):
-            while self.is_recording:
-                sd.sleep(1000)
+        while True:
+            self._start_evt.wait()
+            self._start_evt.clear()
+            try:
+                self.record_once()
+            except Exception as e:
+                # Keep the worker alive so the next recording can still work
+                print(f"Recording failed: {e}")
+                self.master.after(0, self.reset_recording_state)
+
+    def record_once(self):
+        self._stop_evt.clear()
+        if not self.is_recording:
+            # Stopped again before the worker got here
+            self._stop_evt.set()
+
+        # The previous archive write reads straight from the capture buffer, so let it finish first
+        if self.wav_write_future is not None:
+            future, self.wav_write_future = self.wav_write_future, None
+            try:
+                future.result()
+            except OSError as e:
+                print(f"Could not save the previous recording: {e}")
+        self._buf_idx = 0
+        self._capture_sr = self.select_capture_rate()
+        self._recording_filename = os.path.join(self.output_folder, f"audio_{time.time_ns()}.wav")
+
+        # 100 ms blocks: nothing consumes the audio live, so fewer, larger callbacks are cheaper
+        transcribed_until, streamed = 0, False
+        with sd.RawInputStream(samplerate=self._capture_sr, channels=1, dtype='int16',
+                               blocksize=self._capture_sr // 10, callback=self.audio_callback):
+            if self._streaming_mode:
+                transcribed_until, streamed = self.stream_utterances()
+            else:
+                self._stop_evt.wait()
+
+        self.process_recording(transcribed_until, streamed)
+
+    def reset_recording_state(self):
+        # Runs on the Tk thread after a failed recording
+        self.is_recording = False
+        self.record_button.config(bg="white")
 
     def audio_callback(self, indata, frames, time, status):
-        self.recordings.append(indata.copy())
+        # indata is PortAudio's raw buffer; copy its bytes without wrapping them in a NumPy array
+        end = self._buf_idx + len(indata)
+        if end > len(self._buf):
+            # Grow into a new buffer: resizing in place would fail while a previous recording is still being read
+            grown = bytearray(max(end, 2 * len(self._buf)))
+            grown[:self._buf_idx] = memoryview(self._buf)[:self._buf_idx]
+            self._buf = grown
+        self._buf[self._buf_idx:end] = indata
+        self._buf_idx = end
 
     def setup_global_shortcut(self):
         # Use the shortcut passed during initialization
@@ -170,7 +422,8 @@ class AudioRecorder:
         self.master.deiconify()
 
     def exit_application(self):
-        self.keep_transcribing = False
+        self.transcriber.stop()
         self.transcription_thread.join()
+        self._io_pool.shutdown(wait=False)
         self.icon.stop()
         self.master.quit();
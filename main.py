@@ -1,22 +1,31 @@
 import tkinter as tk
-from audio_recorder import AudioRecorder
-import json
+from pathlib import Path
+
+try:
+    from orjson import loads as load_json
+except ImportError:
+    from json import loads as load_json
 
 
 def main():
     root = tk.Tk()
+    # Imported after the Tk root exists so NumPy/SciPy/sounddevice load while the window is already up
+    from audio_recorder import AudioRecorder
 
     # Load configurations from the config file
-    with open('config.json', 'r') as config_file:
-        config = json.load(config_file)
+    config = load_json(Path('config.json').read_bytes())
 
     # Set default values for missing keys (if you want to change it, you must change the config.json file, not here)
     default_config = {
         'model_name': 'medium',
         'shortcut': 'alt+shift+r',
-        'notify_clipboard_saving': True
+        'notify_clipboard_saving': True,
+        'model_idle_timeout': None,
+        'keep_recordings': False,
+        'streaming_mode': False
     }
-    config = {**default_config, **config}
+    for key, value in default_config.items():
+        config.setdefault(key, value)
 
     app = AudioRecorder(root, **config)
     root.mainloop()
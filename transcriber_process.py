@@ -0,0 +1,83 @@
+import gc
+import multiprocessing
+import queue
+
+
+def run_transcriber(model_name, command_queue, result_queue, model_idle_timeout):
+    # Imported here so only the child process pays for loading CTranslate2
+    from whisper_client import WhisperClient
+
+    # Move everything loaded so far out of the tracked generations so later collections have less to traverse
+    gc.freeze()
+
+    transcriber = WhisperClient(model_name=model_name)
+    transcriber.prewarm()
+
+    while True:
+        try:
+            message = command_queue.get(timeout=model_idle_timeout)
+        except queue.Empty:
+            # Idle for longer than the configured timeout: free the model until the next recording
+            transcriber.unload_model(evict=True)
+            message = command_queue.get()
+
+        if message is None:
+            break
+
+        if message['command'] == 'load':
+            if transcriber.evicted:
+                # Hint the weights into the page cache before the reload starts reading them
+                transcriber.prefetch_weights()
+            if transcriber.model is None:
+                # Returns right away so queued recordings are picked up while the model loads
+                transcriber.prewarm()
+            continue
+
+        # Send each segment as soon as it is decoded, then an empty final result once the whole recording is done
+        audio, filename, final = message['data']
+        try:
+            if audio is not None:
+                for text in transcriber.transcribe_stream(audio):
+                    result_queue.put((filename, text, False))
+        except Exception as e:
+            # Report the failure and keep serving later recordings
+            result_queue.put((filename, "", final, str(e)))
+            continue
+        if final:
+            result_queue.put((filename, "", True))
+
+    transcriber.unload_model(evict=True)
+
+
+class TranscriberProcess:
+    def __init__(self, model_name="medium.en", model_idle_timeout=None):
+        self.command_queue = multiprocessing.Queue()
+        self.result_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=run_transcriber,
+            args=(model_name, self.command_queue, self.result_queue, model_idle_timeout),
+            daemon=True
+        )
+
+    def start(self):
+        self.process.start()
+
+    def load_model(self):
+        # Reloads the model in the background if it was unloaded while idle; a no-op otherwise
+        self.command_queue.put({'command': 'load'})
+
+    def submit(self, audio, filename, final=True):
+        # audio may be None to only mark the recording as finished (streaming mode with nothing left after the last
+        # utterance); final is False for the earlier utterances of a streamed recording
+        self.command_queue.put({'command': 'transcribe', 'data': (audio, filename, final)})
+
+    def get_result(self):
+        # Blocks until a (filename, text, final) result arrives, or None once the transcriber has stopped.
+        # A failed transcription arrives as (filename, text, final, error message).
+        return self.result_queue.get()
+
+    def stop(self):
+        self.command_queue.put(None)
+        self.process.join()
+        # Wake up whoever is blocked in get_result
+        self.result_queue.put(None)
@@ -1,34 +1,196 @@
-import torch
-import whisper
+import functools
+import gc
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep CTranslate2's OpenMP threads on separate physical cores instead of SMT siblings.
+# OpenMP reads these when it initializes, so they must be set before faster_whisper imports ctranslate2
+os.environ.setdefault("OMP_PLACES", "cores")
+os.environ.setdefault("OMP_PROC_BIND", "close")
+
+import numpy as np
+import psutil
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from faster_whisper.utils import download_model
+
+SAMPLE_RATE = 16000
+
+# Loaded models keyed by (model_name, compute_type), so loading again after unload_model() reuses the weights
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+# Background loads for prewarm(); a single worker so loads never overlap
+_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+
+def _cpu_thread_count():
+    # CPUs this process is allowed to run on (taskset, cgroup or job limits), capped at the physical core count
+    if hasattr(os, "sched_getaffinity"):
+        available = len(os.sched_getaffinity(0))
+    elif hasattr(psutil.Process, "cpu_affinity"):
+        available = len(psutil.Process().cpu_affinity())
+    else:
+        available = os.cpu_count()
+    return max(1, min(available, psutil.cpu_count(logical=False) or available))
+
+
+@functools.lru_cache(maxsize=1)
+def _cuda_compute_types():
+    # Queried from the CUDA driver once per process; empty when there is no usable GPU
+    import ctranslate2
+    if ctranslate2.get_cuda_device_count() == 0:
+        return ()
+    return tuple(ctranslate2.get_supported_compute_types("cuda"))
+
+
+def _select_cuda_compute_type():
+    # int8 weights with float16 activations run on the tensor cores; older GPUs may only support one of the two
+    cuda_types = _cuda_compute_types()
+    for compute_type in ("int8_float16", "int8", "float16"):
+        if compute_type in cuda_types:
+            return compute_type
+    return "float32"
 
 
 class WhisperClient:
-    def __init__(self, model_name="medium.en"):
+    def __init__(self, model_name="medium.en", beam_size=1, best_of=1, condition_on_previous_text=False,
+                 vad_filter=True):
         self.model_name = model_name
+        # Greedy decoding by default: dictation gains little from beam search and it multiplies decoder work
+        self.beam_size = beam_size
+        self.best_of = best_of
+        self.condition_on_previous_text = condition_on_previous_text
+        self.vad_filter = vad_filter
         self.model = None
+        self.batched_model = None
+        self.batch_size = 8
+        self._model_key = None
+        self._load_future = None
+        # Set once unload_model(evict=True) has dropped the weights, so only a reload after that prefetches them
+        self.evicted = False
+        # Guards the model so an idle unload can't race a load or a transcription
+        self._lock = threading.Lock()
+        # Only one caller builds the model; the others wait on the event instead of queuing on the model lock
+        self._loading = threading.Lock()
+        self._loaded_event = threading.Event()
 
     def load_model(self):
+        while not self._loaded_event.is_set():
+            if self._loading.acquire(blocking=False):
+                try:
+                    # Built outside the model lock so the slow part doesn't hold up anyone else
+                    model = self._cached_model()
+                    with self._lock:
+                        self._load_model(model)
+                finally:
+                    self._loading.release()
+            else:
+                # The timeout lets a waiter take over if the other load failed
+                self._loaded_event.wait(timeout=0.1)
+
+    def _load_model(self, model=None):
+        # Caller holds self._lock
         if self.model is None:
-            self.model = whisper.load_model(self.model_name)
-
-    def unload_model(self):
-        if self.model is not None:
-            # Clear CUDA cache
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-            
-            # Delete model and clear from memory
-            del self.model
+            self.model = model or self._cached_model()
+            self.batched_model = BatchedInferencePipeline(model=self.model)
+            self.evicted = False
+        self._loaded_event.set()
+
+    def _cached_model(self):
+        if _cuda_compute_types():
+            device, compute_type = "cuda", _select_cuda_compute_type()
+            options = {}
+        else:
+            device, compute_type = "cpu", "int8"
+            # CTranslate2 uses 4 threads by default; use one per physical core, since SMT siblings share the
+            # int8 units. Segments are decoded one after another, so a second worker would only split the cores
+            options = {'cpu_threads': _cpu_thread_count(), 'num_workers': 1}
+        self._model_key = (self.model_name, compute_type)
+        with _MODEL_CACHE_LOCK:
+            if self._model_key not in _MODEL_CACHE:
+                _MODEL_CACHE[self._model_key] = WhisperModel(self.model_name, device=device,
+                                                             compute_type=compute_type, **options)
+            return _MODEL_CACHE[self._model_key]
+
+    def prefetch_weights(self):
+        # Pull the model files into the OS page cache in the background so the next load reads from memory
+        threading.Thread(target=self._prefetch_weights, daemon=True).start()
+
+    def _prefetch_weights(self):
+        # Only a readahead hint is worth it: reading the file here would just duplicate the load's own I/O
+        if not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            model_path = download_model(self.model_name, local_files_only=True)
+        except Exception:
+            # Not downloaded yet; WhisperModel will fetch it on load
+            return
+        with os.scandir(model_path) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".bin"):
+                    continue
+                with open(entry.path, "rb") as weights_file:
+                    os.posix_fadvise(weights_file.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+
+    def prewarm(self):
+        # Load and warm up the model in the background; transcribe() waits for it to finish
+        if self._load_future is None or self._load_future.done():
+            self._load_future = _EXECUTOR.submit(self.warm_up)
+
+    def warm_up(self):
+        # Run one short decode so CUDA/CPU kernels are initialized before the first real recording
+        self.load_model()
+        with self._lock:
+            self._load_model()
+            silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+            segments, _ = self.model.transcribe(silence, beam_size=1, vad_filter=False)
+            for _ in segments:
+                pass
+
+    def unload_model(self, evict=False):
+        # Only drops this client's reference unless evict is set, so the next load_model() is instant
+        with self._lock:
+            self._loaded_event.clear()
+            self.batched_model = None
             self.model = None
-            
-            # Force garbage collection
-            import gc
-            gc.collect()
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-
-    def transcribe(self, audio_path):
-        if self.model is None:
-            self.load_model()
-        result = self.model.transcribe(audio_path)
-        return result["text"]
+            if evict and self._model_key is not None:
+                # Delete model and clear from memory. CTranslate2 owns its CUDA memory pool and frees it with the
+                # model, so there is no torch.cuda.empty_cache() here; importing torch would only slow this down
+                with _MODEL_CACHE_LOCK:
+                    _MODEL_CACHE.pop(self._model_key, None)
+                self.evicted = True
+                # The weights are freed by refcounting above; the cycle sweep can run without blocking the caller
+                threading.Thread(target=gc.collect, daemon=True).start()
+
+    def transcribe(self, audio):
+        return " ".join(self.transcribe_stream(audio))
+
+    def transcribe_stream(self, audio):
+        # Accepts a file path or a 16 kHz mono float32 numpy array; yields each segment's stripped, non-empty text
+        # as it is decoded. Callers join the pieces with single spaces.
+        # Consume the background load once; if it failed, load_model() below retries it synchronously
+        load_future, self._load_future = self._load_future, None
+        if load_future is not None:
+            try:
+                load_future.result()
+            except Exception as e:
+                print(f"Background model load failed, retrying: {e}")
+        self.load_model()
+        with self._lock:
+            # Only loads here if an idle unload slipped in since load_model() returned
+            self._load_model()
+            if self.vad_filter and isinstance(audio, np.ndarray) and len(audio) > 30 * SAMPLE_RATE:
+                # Long recordings are split into speech chunks of up to 30 s that are decoded as one batch.
+                # The pipeline needs the VAD for that split, so without it the sequential path below is used
+                # Chunks are decoded independently here, so condition_on_previous_text does not apply
+                segments, _ = self.batched_model.transcribe(audio, batch_size=self.batch_size,
+                                                            beam_size=self.beam_size, best_of=self.best_of,
+                                                            vad_filter=self.vad_filter)
+            else:
+                segments, _ = self.model.transcribe(audio, beam_size=self.beam_size, best_of=self.best_of,
+                                                    condition_on_previous_text=self.condition_on_previous_text,
+                                                    vad_filter=self.vad_filter)
+            for segment in segments:
+                text = segment.text.strip()
+                if text:
+                    yield text